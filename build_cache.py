@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# pylint: disable=invalid-name
+
+"""build_cache.py: Content-addressed cache of generated map data files, used to skip the
+                   generation of maps whose sources have not changed."""
+
+import os
+import json
+import shutil
+import filecmp
+import hashlib
+
+import config
+
+CACHE_DIR = ".butano_aux_cache"
+CACHE_VERSION = 2
+
+# config values which change the content of generated map data files
+RELEVANT_CONFIG = (
+    "PREVENT_TILEMAP_MINIMIZATION",
+    "PREVENT_MAP_CONSOLIDATION",
+    "NAMESPACE",
+    "PARSE_BOUNDARIES",
+    "PARSE_ACTORS",
+    "AUTHOR_NAME",
+    "AUTHOR_MAIL",
+    "FILE_HEADER"
+)
+
+def compute_key(Map):
+    '''Hashes everything the data files of a map are generated from: the name and tiled map file
+       of the map, the referenced tileset images, foton.json, the tile usage of the (combined)
+       tilemap and the relevant config values. Maps may share a tiled map file, so the name is
+       needed to tell them apart.'''
+    digest = hashlib.blake2b(digest_size=16)
+    with open(Map.tmx_filepath,"rb") as tmx:
+        digest.update(tmx.read())
+    for img in Map.tiles.values():
+        with open("graphics/ressources/" + img["image_src"],"rb") as image:
+            digest.update(image.read())
+    if os.path.exists("graphics/ressources/foton.json"):
+        with open("graphics/ressources/foton.json","rb") as foton_json:
+            digest.update(foton_json.read())
+    metadata = {
+        "version": CACHE_VERSION,
+        "year": config.YEAR,
+        "name": Map.name,
+        "bitmap_filename": Map.bitmap_filename,
+        "tiles": Map.tiles,
+        "config": {name: getattr(config, name) for name in RELEVANT_CONFIG}
+    }
+    digest.update(json.dumps(metadata, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+def get_cache_filepaths(key, filepaths):
+    '''Returns the cache location for each of the given output files.'''
+    return [CACHE_DIR + "/" + key + os.path.splitext(filepath)[1] for filepath in filepaths]
+
+def has(key, *filepaths):
+    '''Checks if all output files are cached for the given key.'''
+    return all(os.path.exists(cached) for cached in get_cache_filepaths(key, filepaths))
+
+def restore(key, *filepaths):
+    '''Copies cached output files to their destination. Files which are already identical are
+       left untouched so their modification time does not trigger a rebuild.'''
+    for cached,filepath in zip(get_cache_filepaths(key, filepaths), filepaths):
+        if os.path.exists(filepath) and filecmp.cmp(cached, filepath, shallow=False):
+            continue
+        shutil.copyfile(cached, filepath)
+
+def store(key, *filepaths):
+    '''Copies freshly generated output files into the cache.'''
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for cached,filepath in zip(get_cache_filepaths(key, filepaths), filepaths):
+        shutil.copyfile(filepath, cached)
@@ -0,0 +1,175 @@
+"""cli.py: Command line handling shared by all scripts, so each of them only has to pick the
+          options it supports."""
+
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+# all command line options, keyed by their destination; each script picks a subset of these
+ARGUMENTS = {
+    "force": (('-f','--force'), {
+        "action":'store_true',
+        "help":'Force all files generation'
+    }),
+    "force_img": (('--force-image-gen',), {
+        "action":'store_true',
+        "help":'Force tilemap image generation'
+    }),
+    "force_map": (('--force-map-gen',), {
+        "action":'store_true',
+        "help":'Force tilemap data generation'
+    }),
+    "force_insta": (('--force-instantiations',), {
+        "action":'store_true',
+        "help":'Force foton class instantiation generation'
+    }),
+    "save_temp_imgs": (('-s','--save-temp-files'), {
+        "action":'store_true',
+        "help":'Save temporary files (like *_minimized.bmp and *_combined.bmp and some json files)'
+    }),
+    "tmx_override": (('--map-file',), {
+        "help":'Specifiy tiled TMX map, ignoring foton.json; requires --map-name'
+    }),
+    "map_name": (('--map-name',), {
+        "help":'Specifiy map name, ignoring foton.json; requires --map-file'
+    }),
+    "prevent_minimization": (('--no-minimization',), {
+        "action":'store_true',
+        "help":'Do not minimize tilemap before compression'
+    }),
+    "prevent_consolidation": (('--no-map-consolidation',), {
+        "action":'store_true',
+        "help":'Prevent consolidation of maps so each map will have their own generated tilemap'
+    }),
+    "namespace": (('-n','--namespace'), {
+        "help":'Set namespace for project'
+    }),
+    "objects": (('-o','--create-objects'), {
+        "action":'store_true',
+        "help":'Parse all object layers (actors and boundaries)'
+    }),
+    "actors": (('--create-actors',), {
+        "action":'store_true',
+        "help":'Parse actor layer'
+    }),
+    "boundaries": (('--create-boundaries',), {
+        "action":'store_true',
+        "help":'Parse boundary layer'
+    }),
+    "globals": (('-g','--globals'), {
+        "action":'store_true',
+        "help":'Create globals file'
+    }),
+    "author_name": (('-a','--author'), {
+        "help":'Author name to be put into copyright line.'
+    }),
+    "author_mail": (('-m','--mail'), {
+        "help":'Author mail address to be put into copyright line.'
+    }),
+    "header_line": (('--header-line',), {
+        "help":'Author name to be put into copyright line.'
+    })
+}
+
+# options only reading or generating files, shared by all scripts
+COMMON_ARGUMENTS = (
+    "save_temp_imgs",
+    "tmx_override",
+    "map_name",
+    "prevent_minimization",
+    "prevent_consolidation"
+)
+
+# options changing the content of the generated code files
+CODE_ARGUMENTS = (
+    "namespace",
+    "objects",
+    "actors",
+    "boundaries",
+    "globals",
+    "author_name",
+    "author_mail",
+    "header_line"
+)
+
+# boolean switches and the config values they enable; --force enables different values depending
+# on the script and is therefore passed to parse_args separately
+FLAG_MAP = (
+    ("force_img", ("FORCE_IMAGE_GENERATION",)),
+    ("force_map", ("FORCE_MAP_DATA_GENERATION",)),
+    ("force_insta", ("FORCE_INSTANTIATION_GENERATION",)),
+    ("save_temp_imgs", ("SAVE_TEMPORARY_FILES",)),
+    ("prevent_minimization", ("PREVENT_TILEMAP_MINIMIZATION",)),
+    ("prevent_consolidation", ("PREVENT_MAP_CONSOLIDATION",)),
+    ("objects", ("PARSE_ACTORS","PARSE_BOUNDARIES")),
+    ("actors", ("PARSE_ACTORS",)),
+    ("boundaries", ("PARSE_BOUNDARIES",)),
+    ("globals", ("CREATE_GLOBALS_FILE",))
+)
+
+def build_parser(description, arguments):
+    '''Creates a command line parser supporting the given options from ARGUMENTS.'''
+    argparser = argparse.ArgumentParser(description=description)
+    for dest in arguments:
+        flags, kwargs = ARGUMENTS[dest]
+        argparser.add_argument(*flags, dest=dest, **kwargs)
+    return argparser
+
+def parse_args(description, arguments, forced_config):
+    '''Parses the command line and applies the given options to the config. forced_config lists
+       the config values enabled by --force.'''
+    args = build_parser(description, ("force",) + tuple(arguments)).parse_args()
+
+    if args.force:
+        for config_name in forced_config:
+            setattr(config, config_name, True)
+    for attr,config_names in FLAG_MAP:
+        if getattr(args, attr, False):
+            for config_name in config_names:
+                setattr(config, config_name, True)
+
+    if ( args.tmx_override and not args.map_name ) or \
+       ( not args.tmx_override and args.map_name ):
+        print("If either --map-file or --map-name is set, the other must be set, too")
+        sys.exit()
+    if args.tmx_override:
+        config.TMX_OVERRIDE = args.tmx_override.split('/')[-1]
+        if not os.path.exists("graphics/ressources/" + config.TMX_OVERRIDE):
+            print("Did not find a tiled map file: "+config.TMX_OVERRIDE)
+            sys.exit()
+    if args.map_name:
+        config.MAP_NAME = args.map_name
+    if getattr(args, "namespace", None):
+        config.NAMESPACE = args.namespace
+        config.NAMESPACE_UNDERSCORE = config.NAMESPACE + "_"
+        config.NAMESPACE_COLON = config.NAMESPACE + "::"
+        config.NAMESPACE_UNDERSCORE_UPPER = config.NAMESPACE_UNDERSCORE.upper()
+        config.NAMESPACE_COLON_LOWER = config.NAMESPACE_COLON.lower()
+    if getattr(args, "author_name", None):
+        config.AUTHOR_NAME = args.author_name
+    if getattr(args, "author_mail", None):
+        config.AUTHOR_MAIL = args.author_mail
+    if getattr(args, "header_line", None):
+        config.FILE_HEADER = args.header_line
+
+    return args
+
+def load_foton():
+    '''Loads foton.json, or only the map given on the command line if the map file is
+       overridden.'''
+    if config.TMX_OVERRIDE and config.MAP_NAME:
+        return {"maps": [{"name": config.MAP_NAME, "tmx": config.TMX_OVERRIDE}]}
+    with open("graphics/ressources/foton.json", encoding="utf-8") as foton_json:
+        return json.load(foton_json)
+
+def create_process_pool(max_workers=None):
+    '''Creates a process pool for independent maps. Forks on Linux so workers start quickly;
+       other systems use their default start method, as forking is unsafe on macOS. The config
+       is therefore always passed along explicitly, since it is only inherited when forking.'''
+    mp_context = multiprocessing.get_context("fork") if sys.platform.startswith("linux") else None
+    return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), mp_context=mp_context)
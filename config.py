@@ -1,4 +1,7 @@
-"""globals.py: Used to share global variables between submodules."""
+"""config.py: Used to share global variables between submodules."""
+
+import datetime
+from dataclasses import asdict, make_dataclass
 
 H_FLIP = 1024
 V_FLIP = 2048
@@ -11,6 +14,8 @@ PREVENT_MAP_CONSOLIDATION = False
 NAMESPACE = ""
 NAMESPACE_UNDERSCORE = ""
 NAMESPACE_COLON = ""
+NAMESPACE_UNDERSCORE_UPPER = ""
+NAMESPACE_COLON_LOWER = ""
 PARSE_BOUNDARIES = False
 PARSE_ACTORS = False
 CREATE_GLOBALS_FILE = False
@@ -21,3 +26,44 @@ SAVE_TEMPORARY_FILES = False
 AUTHOR_NAME = "Butano Auxiliary"
 AUTHOR_MAIL = "butano_auxiliary@gba.org"
 FILE_HEADER = "This file is part of a super awesome GBA project!"
+YEAR = datetime.date.today().year
+
+# names of all config values above, handed to worker processes by snapshot and restore
+CONFIG_NAMES = (
+    "H_FLIP",
+    "V_FLIP",
+    "FORCE_IMAGE_GENERATION",
+    "FORCE_MAP_DATA_GENERATION",
+    "FORCE_INSTANTIATION_GENERATION",
+    "PREVENT_TILEMAP_MINIMIZATION",
+    "PREVENT_MAP_CONSOLIDATION",
+    "NAMESPACE",
+    "NAMESPACE_UNDERSCORE",
+    "NAMESPACE_COLON",
+    "NAMESPACE_UNDERSCORE_UPPER",
+    "NAMESPACE_COLON_LOWER",
+    "PARSE_BOUNDARIES",
+    "PARSE_ACTORS",
+    "CREATE_GLOBALS_FILE",
+    "TMX_OVERRIDE",
+    "MAP_NAME",
+    "SAVE_TEMPORARY_FILES",
+    "AUTHOR_NAME",
+    "AUTHOR_MAIL",
+    "FILE_HEADER",
+    "YEAR"
+)
+
+# frozen copy of all config values, built from the names above so they are only listed once;
+# it has to belong to this module so spawned worker processes can unpickle it
+Config = make_dataclass("Config", CONFIG_NAMES, frozen=True)
+Config.__module__ = __name__
+
+def snapshot():
+    '''Returns the current config values as an immutable Config, used to hand them to worker
+       processes.'''
+    return Config(**{name: globals()[name] for name in CONFIG_NAMES})
+
+def restore(values):
+    '''Sets the config values from a Config snapshot, e.g. inside a worker process.'''
+    globals().update(asdict(values))
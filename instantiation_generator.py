@@ -5,266 +5,302 @@
                         library.cpp, map.cpp and stage.cpp, respectively."""
 
 import os
-import sys
-import json
-import argparse
+from string import Template
 
+import cli
 import config
 import tilemap_compressor as tc
 import mapdata_generator as mg
 import tilemap_minimizer as tm
-from mapdata_models import MapObject
+from mapdata_models import MapSizeObject
+
+# all files written by write_instantiation_files, located in the include folder
+INSTANTIATION_FILES = (
+    "map_instantiations.hpp",
+    "stage_instantiations.hpp",
+    "library_mapinit_instantiations.hpp",
+    "library_pubfunc_instantiations.hpp",
+    "library_tilemap_instantiations.hpp",
+    "library_member_instantiations.hpp",
+    "library_template_instantiations.hpp"
+)
+
+# value type of the sprite map, which is sized by the number of sprites instead of maps
+SPRITE_VALUE_TYPE = "const bn::sprite_item*"
+
+# templates rendered once for every map size with its x, y and count
+MAP_INSTANTIATION_TEMPLATE = Template("""\
+template Map::Map(
+    const ct::tilemaps::tm_t<$x,$y>&,
+    const bn::regular_bg_tiles_item&,
+    const bn::bg_palette_item&,
+    const ct::tilemaps::polygon_t&,
+    const ct::tilemaps::boundary_metadata_t&,
+    const ct::tilemaps::metadata_t&,
+    const ct::tilemaps::polygon_t&,
+    const ct::tilemaps::boundary_metadata_t&);
+""")
+
+STAGE_INSTANTIATION_TEMPLATE = Template("""\
+if( map_size.width() == $x && map_size.height() == $y ) {
+  _map = new ct::Map(
+    lib->get_tilemap<$x,$y>(_map_name),
+    lib->get_tilemap_graphic(_map_name),
+    lib->get_tilemap_palette(_map_name),
+    lib->get_tilemap_boundaries(_map_name),
+    lib->get_tilemap_boundary_metadata(_map_name),
+    lib->get_tilemap_metadata(_map_name),
+    lib->get_tilemap_gateways(_map_name),
+    lib->get_tilemap_gateway_metadata(_map_name)
+  );
+} else """)
+
+STAGE_INSTANTIATION_FALLBACK = """\
+{
+  BN_ASSERT(false,"map size was undefined in set_new_map: ",map_size.width(),"x",map_size.height());
+}"""
+
+LIBRARY_MAPINIT_TEMPLATE = Template("""\
+    _tilemaps_${x}_$y(init_tilemaps<$x,$y,$count>()),
+""")
+
+LIBRARY_PUBFUNC_TEMPLATE = Template("""\
+const ct::tilemaps::tm_t<$x,$y>& get_tilemap_${x}_$y(const bn::string<8>&) const;
+""")
+
+LIBRARY_TILEMAP_TEMPLATE = Template("""\
+template<>
+    const bn::unordered_map<bn::string<8>, const ct::tilemaps::tm_t<$x,$y>*, $count>
+        init_tilemaps<$x,$y,$count>();
+template<> const ct::tilemaps::tm_t<$x,$y>& get_tilemap<$x,$y>(const bn::string<8>&, const Library&);
+""")
+
+LIBRARY_MEMBER_TEMPLATE = Template("""\
+    const bn::unordered_map<bn::string<8>, const ct::tilemaps::tm_t<$x,$y>*, $count> _tilemaps_${x}_$y;
+""")
+
+LIBRARY_GETTER_TEMPLATE = Template("""\
+const ct::tilemaps::tm_t<$x,$y>& Library::get_tilemap_${x}_$y(const bn::string<8>(&key)) const {
+    return *(_tilemaps_${x}_$y.at(key));
+}
+""")
+
+LIBRARY_GET_TILEMAP_TEMPLATE = Template("""\
+template<> const ct::tilemaps::tm_t<$x,$y>& get_tilemap<$x,$y>(const bn::string<8>(&key), const Library(&lib)) {
+    return lib.get_tilemap_${x}_$y(key);
+}
+""")
+
+LIBRARY_GET_TILEMAP_INSTANTIATION_TEMPLATE = Template("""\
+template const ct::tilemaps::tm_t<$x,$y>& Library::get_tilemap<$x,$y>(const bn::string<8>&) const;
+""")
+
+# unordered_map init functions of Library holding an entry for every map: function name, name of
+# the member it initialises, value type, value template and whether the function ends a group of
+# declarations and is therefore followed by a blank line
+LIBRARY_MAP_INITS = (
+    ("init_tilemaps_index", "_tilemaps_index",
+     "bn::size",
+     Template("bn::size($x,$y)"), False),
+    ("init_tilemap_graphics", "_tilemap_graphics",
+     "const bn::regular_bg_tiles_item*",
+     Template("ct::tilemaps::$name::bg_tiles"), False),
+    ("init_tilemap_palettes", "_tilemap_palettes",
+     "const bn::bg_palette_item*",
+     Template("ct::tilemaps::$name::bg_palette"), False),
+    ("init_tilemaps_spawnpoints", "_tilemap_spawnpoints",
+     "const ct::tilemaps::spawn_point_t*",
+     Template("ct::tilemaps::$name::spawn_points"), False),
+    ("init_tilemaps_boundaries", "_tilemap_boundaries",
+     "const ct::tilemaps::polygon_t*",
+     Template("ct::tilemaps::$name::boundaries"), False),
+    ("init_tilemaps_boundary_metadata", "_tilemap_boundary_metadata",
+     "const ct::tilemaps::boundary_metadata_t*",
+     Template("ct::tilemaps::$name::boundary_metadata"), False),
+    ("init_tilemaps_metadata", "_tilemap_metadata",
+     "const ct::tilemaps::metadata_t*",
+     Template("&ct::tilemaps::$name::metadata"), False),
+    ("init_tilemaps_gateways", "_tilemap_gateways",
+     "const ct::tilemaps::polygon_t*",
+     Template("ct::tilemaps::$name::gateways"), False),
+    ("init_tilemaps_gateway_metadata", "_tilemap_gateway_metadata",
+     "const ct::tilemaps::boundary_metadata_t*",
+     Template("ct::tilemaps::$name::gateway_metadata"), True),
+    ("init_tilemaps_actors_metadata", "_tilemap_actors_metadata",
+     "const ct::actors::metadata_t*",
+     Template("&ct::actors::$name::metadata"), False),
+    ("init_tilemaps_characters", "_tilemap_characters",
+     "const ct::actors::character_t*",
+     Template("ct::actors::$name::characters"), False),
+    ("init_tilemaps_containers", "_tilemap_containers",
+     "const ct::actors::container_t*",
+     Template("ct::actors::$name::containers"), True)
+)
 
 def calculate_unordered_map_size(length):
-    '''Returns the smallest power of two greater than length.'''
-    size = 1
-    while length > (1<<size):
-        size += 1
-    return 1<<size
+    '''Returns the smallest power of two not less than length, but at least 2.'''
+    return 1 << max(1, (length-1).bit_length())
 
 def get_map_sizes(all_maps):
-    '''Creates a dictionary of all maps keyed by their WIDTH:HEIGHT.'''
+    '''Groups all maps by their size. Returns a list with an entry for every size, in order of
+       first appearance.'''
     map_sizes = dict()
     for Map in all_maps:
-        mapid = str(Map.width)+":"+str(Map.height)
-        if mapid in map_sizes:
-            map_sizes[mapid]['count'] += 1
-            map_sizes[mapid]['names'].append(Map.name)
-        else:
-            map_sizes[mapid] = {
-                'x': str(Map.width),
-                'y': str(Map.height),
-                'count': 1,
-                'names': [Map.name]
-            }
-    return map_sizes
+        size = map_sizes.get((Map.width,Map.height))
+        if size is None:
+            size = MapSizeObject(str(Map.width), str(Map.height))
+            map_sizes[(Map.width,Map.height)] = size
+        size.count += 1
+        size.names.append(Map.name)
+        size.keys.append(Map.name[0:8])
+    return list(map_sizes.values())
 
 def get_total_map_size(map_sizes):
     '''Simply counts the total number of maps.'''
-    count = 0
-    for size in map_sizes.values():
-        count += size["count"]
-    return count
+    return sum(size.count for size in map_sizes)
+
+def render_per_map_size(template, map_sizes):
+    '''Renders a template once for every map size, providing its x, y and count.'''
+    return "".join(template.substitute(x=size.x, y=size.y, count=size.count)
+                   for size in map_sizes)
+
+def unordered_map_type(value_type, capacity):
+    '''Returns the type of an unordered_map keyed by names of up to 8 characters.'''
+    return f"bn::unordered_map<bn::string<8>, {value_type}, {capacity}>"
+
+def render_map_init(function, value_type, capacity, entries):
+    '''Renders a function returning an unordered_map of the given capacity, filled with the given
+       (key, value) entries. Keys must not be longer than 8 characters.'''
+    map_type = unordered_map_type(value_type, capacity)
+    output = [
+        f"const {map_type} {function}() {{\n",
+        f"    {map_type} map;\n"
+    ]
+    output.extend(
+        f"    map.insert(bn::pair<bn::string<8>, {value_type}>(\"{key}\",{value}));\n"
+        for key,value in entries
+    )
+    output.append("    return map;\n}\n")
+    return "".join(output)
 
 def write_map_instantiation_file(map_sizes):
     '''This writes all templates for all map sizes into map.cpp'''
-    with open("include/map_instantiations.hpp","w",encoding="UTF-8") as hpp:
-        for size in map_sizes.values():
-            hpp.write("template Map::Map(\n")
-            hpp.write("    const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">&,\n")
-            hpp.write("    const bn::regular_bg_tiles_item&,\n")
-            hpp.write("    const bn::bg_palette_item&,\n")
-            hpp.write("    const ct::tilemaps::polygon_t&,\n")
-            hpp.write("    const ct::tilemaps::boundary_metadata_t&,\n")
-            hpp.write("    const ct::tilemaps::metadata_t&,\n")
-            hpp.write("    const ct::tilemaps::polygon_t&,\n")
-            hpp.write("    const ct::tilemaps::boundary_metadata_t&);\n")
+    mg.write_source_file("include/map_instantiations.hpp",
+                         render_per_map_size(MAP_INSTANTIATION_TEMPLATE, map_sizes))
 
 def write_stage_instantiation_file(map_sizes):
     '''This writes all map creations with all map sizes into stage.cpp'''
-    with open("include/stage_instantiations.hpp","w",encoding="UTF-8") as hpp:
-        for size in map_sizes.values():
-            hpp.write("if( map_size.width() == "+size['x']+" && map_size.height() == "+size['y']+" ) {\n")
-            hpp.write("  _map = new ct::Map(\n")
-            hpp.write("    lib->get_tilemap<"+size['x']+","+size['y']+">(_map_name),\n")
-            hpp.write("    lib->get_tilemap_graphic(_map_name),\n")
-            hpp.write("    lib->get_tilemap_palette(_map_name),\n")
-            hpp.write("    lib->get_tilemap_boundaries(_map_name),\n")
-            hpp.write("    lib->get_tilemap_boundary_metadata(_map_name),\n")
-            hpp.write("    lib->get_tilemap_metadata(_map_name),\n")
-            hpp.write("    lib->get_tilemap_gateways(_map_name),\n")
-            hpp.write("    lib->get_tilemap_gateway_metadata(_map_name)\n")
-            hpp.write("  );\n")
-            hpp.write("} else ")
-        hpp.write("{\n")
-        hpp.write("  BN_ASSERT(false,\"map size was undefined in set_new_map: \",map_size.width(),\"x\",map_size.height());\n")
-        hpp.write("}")
+    mg.write_source_file("include/stage_instantiations.hpp",
+                         render_per_map_size(STAGE_INSTANTIATION_TEMPLATE, map_sizes) +
+                         STAGE_INSTANTIATION_FALLBACK)
 
 def write_library_mapinit_instantiation_file(map_sizes):
     '''This writes all member initialisations into the constructor of Library into library.hpp'''
-    with open("include/library_mapinit_instantiations.hpp","w",encoding="UTF-8") as hpp:
-        for size in map_sizes.values():
-            hpp.write("    _tilemaps_"+size['x']+"_"+size['y']+"(init_tilemaps<"+size['x']+","+size['y']+","+str(size['count'])+">()),\n")
+    mg.write_source_file("include/library_mapinit_instantiations.hpp",
+                         render_per_map_size(LIBRARY_MAPINIT_TEMPLATE, map_sizes))
 
 def write_library_pubfunc_instantiation_file(map_sizes):
     '''This writes the public function declarations into library.hpp'''
-    with open("include/library_pubfunc_instantiations.hpp","w",encoding="UTF-8") as hpp:
-        for size in map_sizes.values():
-            hpp.write("const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">& get_tilemap_"+size['x']+"_"+size['y']+"(const bn::string<8>&) const;\n")
+    mg.write_source_file("include/library_pubfunc_instantiations.hpp",
+                         render_per_map_size(LIBRARY_PUBFUNC_TEMPLATE, map_sizes))
 
 def write_library_tilemap_instantiation_file(map_sizes):
     '''This writes all template declarations for the different map sizes.'''
-    with open("include/library_tilemap_instantiations.hpp","w",encoding="UTF-8") as hpp:
-        for size in map_sizes.values():
-            hpp.write("template<>\n")
-            hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">*, "+str(size['count'])+">\n")
-            hpp.write("        init_tilemaps<"+size['x']+","+size['y']+","+str(size['count'])+">();\n")
-            hpp.write("template<> const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">& get_tilemap<"+size['x']+","+size['y']+">(const bn::string<8>&, const Library&);\n")
+    mg.write_source_file("include/library_tilemap_instantiations.hpp",
+                         render_per_map_size(LIBRARY_TILEMAP_TEMPLATE, map_sizes))
 
 def write_library_member_instantiation_file(map_sizes,sprites):
     '''This writes all member variable and function declarations into library.hpp with the
        correct sizes for the unordered_maps.'''
     map_size = str(calculate_unordered_map_size(get_total_map_size(map_sizes)))
-    sprite_size = str(calculate_unordered_map_size(len(sprites)))
+    sprite_map_type = unordered_map_type(SPRITE_VALUE_TYPE,
+                                         calculate_unordered_map_size(len(sprites)))
+
+    output = [
+        f"    const {unordered_map_type(value_type, map_size)} {function}();\n"
+        for function,_,value_type,_,_ in LIBRARY_MAP_INITS
+    ]
+    output.append(f"    const {sprite_map_type} init_sprites();\n\n")
+
+    # the index comes first, followed by the per size members and all other maps
+    (_,index_member,index_type,_,_), *other_inits = LIBRARY_MAP_INITS
+    output.append(f"    const {unordered_map_type(index_type, map_size)} {index_member};\n\n")
+
+    output.append(render_per_map_size(LIBRARY_MEMBER_TEMPLATE, map_sizes))
+    output.append("\n")
 
-    with open("include/library_member_instantiations.hpp","w",encoding="UTF-8") as hpp:
-        hpp.write("    const bn::unordered_map<bn::string<8>, bn::size, "+map_size+"> init_tilemaps_index();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const bn::regular_bg_tiles_item*, "+map_size+"> init_tilemap_graphics();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const bn::bg_palette_item*, "+map_size+"> init_tilemap_palettes();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::spawn_point_t*, "+map_size+"> init_tilemaps_spawnpoints();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::polygon_t*, "+map_size+"> init_tilemaps_boundaries();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::boundary_metadata_t*, "+map_size+"> init_tilemaps_boundary_metadata();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::metadata_t*, "+map_size+"> init_tilemaps_metadata();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::polygon_t*, "+map_size+"> init_tilemaps_gateways();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::boundary_metadata_t*, "+map_size+"> init_tilemaps_gateway_metadata();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::actors::metadata_t*, "+map_size+"> init_tilemaps_actors_metadata();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::actors::character_t*, "+map_size+"> init_tilemaps_characters();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::actors::container_t*, "+map_size+"> init_tilemaps_containers();\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const bn::sprite_item*, "+sprite_size+"> init_sprites();\n\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, bn::size, "+map_size+"> _tilemaps_index;\n\n")
-
-        for size in map_sizes.values():
-            hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">*, "+str(size['count'])+"> _tilemaps_"+size['x']+"_"+size['y']+";\n")
-        hpp.write("\n")
-
-        hpp.write("    const bn::unordered_map<bn::string<8>, const bn::regular_bg_tiles_item*, "+map_size+"> _tilemap_graphics;\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const bn::bg_palette_item*, "+map_size+"> _tilemap_palettes;\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::spawn_point_t*, "+map_size+"> _tilemap_spawnpoints;\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::polygon_t*, "+map_size+"> _tilemap_boundaries;\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::boundary_metadata_t*, "+map_size+"> _tilemap_boundary_metadata;\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::metadata_t*, "+map_size+"> _tilemap_metadata;\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::polygon_t*, "+map_size+"> _tilemap_gateways;\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::tilemaps::boundary_metadata_t*, "+map_size+"> _tilemap_gateway_metadata;\n\n")
-
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::actors::metadata_t*, "+map_size+"> _tilemap_actors_metadata;\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::actors::character_t*, "+map_size+"> _tilemap_characters;\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const ct::actors::container_t*, "+map_size+"> _tilemap_containers;\n")
-        hpp.write("    const bn::unordered_map<bn::string<8>, const bn::sprite_item*, "+sprite_size+"> _sprites;\n")
+    for _,member,value_type,_,blank_line in other_inits:
+        output.append(f"    const {unordered_map_type(value_type, map_size)} {member};\n")
+        # the sprite map directly follows the last group without a blank line
+        if blank_line and member != other_inits[-1][1]:
+            output.append("\n")
+    output.append(f"    const {sprite_map_type} _sprites;\n")
+
+    mg.write_source_file("include/library_member_instantiations.hpp", "".join(output))
 
 def write_library_template_instantiation_file(map_sizes,sprites):
     '''This writes all template and map fill functions into the library.cpp file.'''
     map_size = str(calculate_unordered_map_size(get_total_map_size(map_sizes)))
     sprite_size = str(calculate_unordered_map_size(len(sprites)))
 
-    with open("include/library_template_instantiations.hpp","w",encoding="UTF-8") as hpp:
-        for size in map_sizes.values():
-            hpp.write("const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">& Library::get_tilemap_"+size['x']+"_"+size['y']+"(const bn::string<8>(&key)) const {\n")
-            hpp.write("    return *(_tilemaps_"+size['x']+"_"+size['y']+".at(key));\n")
-            hpp.write("}\n")
-        hpp.write("\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, bn::size, "+map_size+"> Library::init_tilemaps_index() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, bn::size, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, bn::size>(\""+map_name[0:8]+"\",bn::size("+size['x']+","+size['y']+")));\n")
-        hpp.write("    return map;\n}\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const bn::regular_bg_tiles_item*, "+map_size+"> Library::init_tilemap_graphics() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const bn::regular_bg_tiles_item*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const bn::regular_bg_tiles_item*>(\""+map_name[0:8]+"\",ct::tilemaps::"+map_name+"::bg_tiles));\n")
-        hpp.write("    return map;\n}\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const bn::bg_palette_item*, "+map_size+"> Library::init_tilemap_palettes() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const bn::bg_palette_item*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const bn::bg_palette_item*>(\""+map_name[0:8]+"\",ct::tilemaps::"+map_name+"::bg_palette));\n")
-        hpp.write("    return map;\n}\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const ct::tilemaps::spawn_point_t*, "+map_size+"> Library::init_tilemaps_spawnpoints() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const ct::tilemaps::spawn_point_t*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const ct::tilemaps::spawn_point_t*>(\""+map_name[0:8]+"\",ct::tilemaps::"+map_name+"::spawn_points));\n")
-        hpp.write("    return map;\n}\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const ct::tilemaps::polygon_t*, "+map_size+"> Library::init_tilemaps_boundaries() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const ct::tilemaps::polygon_t*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const ct::tilemaps::polygon_t*>(\""+map_name[0:8]+"\",ct::tilemaps::"+map_name+"::boundaries));\n")
-        hpp.write("    return map;\n}\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const ct::tilemaps::boundary_metadata_t*, "+map_size+"> Library::init_tilemaps_boundary_metadata() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const ct::tilemaps::boundary_metadata_t*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const ct::tilemaps::boundary_metadata_t*>(\""+map_name[0:8]+"\",ct::tilemaps::"+map_name+"::boundary_metadata));\n")
-        hpp.write("    return map;\n}\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const ct::tilemaps::metadata_t*, "+map_size+"> Library::init_tilemaps_metadata() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const ct::tilemaps::metadata_t*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const ct::tilemaps::metadata_t*>(\""+map_name[0:8]+"\",&ct::tilemaps::"+map_name+"::metadata));\n")
-        hpp.write("    return map;\n}\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const ct::tilemaps::polygon_t*, "+map_size+"> Library::init_tilemaps_gateways() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const ct::tilemaps::polygon_t*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const ct::tilemaps::polygon_t*>(\""+map_name[0:8]+"\",ct::tilemaps::"+map_name+"::gateways));\n")
-        hpp.write("    return map;\n}\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const ct::tilemaps::boundary_metadata_t*, "+map_size+"> Library::init_tilemaps_gateway_metadata() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const ct::tilemaps::boundary_metadata_t*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const ct::tilemaps::boundary_metadata_t*>(\""+map_name[0:8]+"\",ct::tilemaps::"+map_name+"::gateway_metadata));\n")
-        hpp.write("    return map;\n}\n\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const ct::actors::metadata_t*, "+map_size+"> Library::init_tilemaps_actors_metadata() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const ct::actors::metadata_t*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const ct::actors::metadata_t*>(\""+map_name[0:8]+"\",&ct::actors::"+map_name+"::metadata));\n")
-        hpp.write("    return map;\n}\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const ct::actors::character_t*, "+map_size+"> Library::init_tilemaps_characters() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const ct::actors::character_t*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const ct::actors::character_t*>(\""+map_name[0:8]+"\",ct::actors::"+map_name+"::characters));\n")
-        hpp.write("    return map;\n}\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const ct::actors::container_t*, "+map_size+"> Library::init_tilemaps_containers() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const ct::actors::container_t*, "+map_size+"> map;\n")
-        for size in map_sizes.values():
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const ct::actors::container_t*>(\""+map_name[0:8]+"\",ct::actors::"+map_name+"::containers));\n")
-        hpp.write("    return map;\n}\n\n")
-
-        hpp.write("const bn::unordered_map<bn::string<8>, const bn::sprite_item*, "+sprite_size+"> Library::init_sprites() {\n")
-        hpp.write("    bn::unordered_map<bn::string<8>, const bn::sprite_item*, "+sprite_size+"> map;\n")
-        for char_name in [x['name'] for x in sprites]:
-            hpp.write("    map.insert(bn::pair<bn::string<8>, const bn::sprite_item*>(\""+char_name[0:8]+"\",&bn::sprite_items::"+char_name+"));\n")
-        hpp.write("    return map;\n}\n\n")
-
-        hpp.write("namespace tilemaps {\n")
-        for size in map_sizes.values():
-            hpp.write("template<> const bn::unordered_map<bn::string<8>, const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">*, "+str(size['count'])+"> init_tilemaps<"+size['x']+","+size['y']+","+str(size['count'])+">() {\n")
-            hpp.write("    bn::unordered_map<bn::string<8>, const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">*, "+str(size['count'])+"> map;\n")
-            for map_name in size["names"]:
-                hpp.write("    map.insert(bn::pair<bn::string<8>, const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">*>(\""+map_name[0:8]+"\",&ct::tilemaps::"+map_name+"::tilemap));\n")
-            hpp.write("    return map;\n")
-            hpp.write("}\n\n")
-
-        for size in map_sizes.values():
-            hpp.write("template<> const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">& get_tilemap<"+size['x']+","+size['y']+">(const bn::string<8>(&key), const Library(&lib)) {\n")
-            hpp.write("    return lib.get_tilemap_"+size['x']+"_"+size['y']+"(key);\n")
-            hpp.write("}\n")
-        hpp.write("}\n\n")
-
-        for size in map_sizes.values():
-            hpp.write("template const ct::tilemaps::tm_t<"+size['x']+","+size['y']+">& Library::get_tilemap<"+size['x']+","+size['y']+">(const bn::string<8>&) const;\n")
-        hpp.write("}\n\n")
-
+    output = []
+    output.append(render_per_map_size(LIBRARY_GETTER_TEMPLATE, map_sizes))
+    output.append("\n")
+
+    # every init function holds one entry per map, so collect all of them in a single pass
+    init_entries = [[] for _ in LIBRARY_MAP_INITS]
+    for size in map_sizes:
+        for map_name,key in zip(size.names, size.keys):
+            for entries,(_,_,_,value,_) in zip(init_entries, LIBRARY_MAP_INITS):
+                entries.append((key, value.substitute(x=size.x, y=size.y, name=map_name)))
+    for entries,(function,_,value_type,_,blank_line) in zip(init_entries, LIBRARY_MAP_INITS):
+        output.append(render_map_init("Library::"+function, value_type, map_size, entries))
+        if blank_line:
+            output.append("\n")
+
+    output.append(render_map_init(
+        "Library::init_sprites", SPRITE_VALUE_TYPE, sprite_size,
+        [(sprite['name'][0:8], "&bn::sprite_items::"+sprite['name']) for sprite in sprites]
+    ))
+    output.append("\n")
+
+    output.append("namespace tilemaps {\n")
+    for size in map_sizes:
+        xy, count = f"{size.x},{size.y}", size.count
+        output.append("template<> ")
+        output.append(render_map_init(
+            f"init_tilemaps<{xy},{count}>", f"const ct::tilemaps::tm_t<{xy}>*", count,
+            [(key, f"&ct::tilemaps::{map_name}::tilemap")
+             for map_name,key in zip(size.names, size.keys)]
+        ))
+        output.append("\n")
+
+    output.append(render_per_map_size(LIBRARY_GET_TILEMAP_TEMPLATE, map_sizes))
+    output.append("}\n\n")
+
+    output.append(render_per_map_size(LIBRARY_GET_TILEMAP_INSTANTIATION_TEMPLATE, map_sizes))
+    output.append("}\n\n")
+
+    mg.write_source_file("include/library_template_instantiations.hpp", "".join(output))
+
+def is_instantiation_up_to_date(all_maps):
+    '''Checks if all instantiation files exist and are newer than foton.json and every tiled map
+       file, since map names, map sizes and sprites are all they are generated from.'''
+    include_mtimes = mg.get_file_mtimes("include")
+    if not all(filename in include_mtimes for filename in INSTANTIATION_FILES):
+        return False
+    source_mtimes = [os.path.getmtime(Map.tmx_filepath) for Map in all_maps]
+    if os.path.exists("graphics/ressources/foton.json"):
+        source_mtimes.append(os.path.getmtime("graphics/ressources/foton.json"))
+    return min(include_mtimes[filename] for filename in INSTANTIATION_FILES) >= \
+           max(source_mtimes, default=0)
 
 def write_instantiation_files(all_maps,sprites):
     '''Wrapper function calling all instantiation functions.'''
+    if not config.FORCE_INSTANTIATION_GENERATION and is_instantiation_up_to_date(all_maps):
+        print("Maps and sprites not modified, skipping generation of instantiation files")
+        return
+
     map_sizes = get_map_sizes(all_maps)
 
     write_map_instantiation_file(map_sizes)
@@ -278,126 +314,31 @@ def write_instantiation_files(all_maps,sprites):
 
 
 if __name__ == "__main__":
-    argparser = argparse.ArgumentParser(
-        description="""
-            Generate butano-compatible map headers from tiled projects.
-            """)
-    argparser.add_argument('-f','--force',dest='force',action='store_true',
-                           help='Force all files generation')
-    argparser.add_argument('--force-instantiations',dest='force_insta',action='store_true',
-                           help='Force foton class instantiation generation')
-    argparser.add_argument('-s','--save-temp-files',dest='save_temp_imgs',action='store_true',
-                           help="""Save temporary files (like *_minimized.bmp and *_combined.bmp
-                                   and some json files)""")
-    argparser.add_argument('--map-file',dest='tmx_override',
-                           help='Specifiy tiled TMX map, ignoring foton.json; requires --map-name')
-    argparser.add_argument('--map-name',dest='map_name',
-                           help='Specifiy map name, ignoring foton.json; requires --map-file')
-    argparser.add_argument('--no-minimization',dest='prevent_minimization',action='store_true',
-                           help='Do not minimize tilemap before compression')
-    argparser.add_argument('--no-map-consolidation',
-                           dest='prevent_consolidation',action='store_true',
-                           help="""Prevent consolidation of maps so each map will have their own
-                                   generated tilemap""")
-    argparser.add_argument('-n','--namespace',dest='namespace',
-                           help='Set namespace for project')
-    argparser.add_argument('-o','--create-objects',dest='objects',action='store_true',
-                           help='Parse all object layers (actors and boundaries)')
-    argparser.add_argument('--create-actors',dest='actors',action='store_true',
-                           help='Parse actor layer')
-    argparser.add_argument('--create-boundaries',dest='boundaries',action='store_true',
-                           help='Parse boundary layer')
-    argparser.add_argument('-g','--globals',dest="globals",action='store_true',
-                           help='Create globals file')
-    argparser.add_argument('-a','--author',dest='author_name',
-                           help='Author name to be put into copyright line.')
-    argparser.add_argument('-m','--mail',dest='author_mail',
-                           help='Author mail address to be put into copyright line.')
-    argparser.add_argument('--header-line',dest='header_line',
-                           help='Author name to be put into copyright line.')
-    args = argparser.parse_args()
-
-    if args.force:
-        config.FORCE_IMAGE_GENERATION = True
-        config.FORCE_MAP_DATA_GENERATION = True
-    if args.force_insta:
-        config.FORCE_INSTANTIATION_GENERATION = True
-    if args.save_temp_imgs:
-        config.SAVE_TEMPORARY_FILES = True
-    if ( args.tmx_override and not args.map_name ) or \
-       ( not args.tmx_override and args.map_name ):
-        print("If either --map-file or --map-name is set, the other must be set, too")
-        sys.exit()
-    if args.tmx_override:
-        config.TMX_OVERRIDE = args.tmx_override.split('/')[-1]
-        if not os.path.exists("graphics/ressources/" + config.TMX_OVERRIDE):
-            print("Did not find a tiled map file: "+config.TMX_OVERRIDE)
-            sys.exit()
-    if args.map_name:
-        config.MAP_NAME = args.map_name
-    if args.prevent_minimization:
-        config.PREVENT_TILEMAP_MINIMIZATION = True
-    if args.prevent_consolidation:
-        config.PREVENT_MAP_CONSOLIDATION = True
-    if args.namespace:
-        config.NAMESPACE = args.namespace
-        config.NAMESPACE_UNDERSCORE = config.NAMESPACE + "_"
-        config.NAMESPACE_COLON = config.NAMESPACE + "::"
-    if args.objects:
-        config.PARSE_ACTORS = True
-        config.PARSE_BOUNDARIES = True
-    if args.objects:
-        config.PARSE_ACTORS = True
-    if args.objects:
-        config.PARSE_BOUNDARIES = True
-    if args.globals:
-        config.CREATE_GLOBALS_FILE = True
-    if args.author_name:
-        config.AUTHOR_NAME = args.author_name
-    if args.author_mail:
-        config.AUTHOR_MAIL = args.author_mail
-    if args.header_line:
-        config.FILE_HEADER = args.header_line
-
-    with open("graphics/ressources/foton.json", encoding="utf-8") as foton_json:
-        if config.TMX_OVERRIDE and config.MAP_NAME:
-            foton = json.loads('[{"name":"'+config.MAP_NAME+'","tmx":"'+config.TMX_OVERRIDE+'"}]')
-        else:
-            foton = json.load(foton_json)
-
-        map_data = tm.get_map_data(foton['maps'])
-        if not config.PREVENT_MAP_CONSOLIDATION:
-            for map_name in map_data["combined_maps"]:
-                cmap_data = map_data["combined_maps"][map_name]
-                bitmap,tilemap_width,success = tc.create_tilemap(cmap_data,True)
-                if success:
-                    for combined_map in cmap_data["maps"]:
-                        map_data["maps"][combined_map]["combined_tilemap"] = {
-                            "mapdict":cmap_data,
-                            "bitmap":bitmap,
-                            "tilemap_width":tilemap_width
-                        }
-
-        all_maps = []
-        for map_name in map_data["maps"]:
-            Map = MapObject()
-            Map.init(map_data["maps"][map_name])
-            Map.gather_map_data()
-            Map.calculate_tilemap_data()
-            all_maps.append(Map)
-
-            if not config.FORCE_MAP_DATA_GENERATION and \
-               os.path.exists("include/" + Map.name + ".hpp") and \
-               os.path.getctime("include/" + Map.name + ".hpp") >= \
-                   os.path.getctime(Map.tmx_filepath) and \
-               os.path.exists("src/" + Map.name + ".cpp") and \
-               os.path.getctime("src/" + Map.name + ".cpp") >= \
-                   os.path.getctime(Map.tmx_filepath):
-                print("Source tiled map not modified, skipping generation of new data files")
-            else:
-                mg.write_tilemap_header_file(Map)
-                mg.write_tilemap_cpp_file(Map)
-        
+    cli.parse_args(
+        "Generate butano-compatible map headers from tiled projects.",
+        ("force_insta",) + cli.COMMON_ARGUMENTS + cli.CODE_ARGUMENTS,
+        ("FORCE_IMAGE_GENERATION","FORCE_MAP_DATA_GENERATION","FORCE_INSTANTIATION_GENERATION")
+    )
+
+    foton = cli.load_foton()
+    map_data = tm.get_map_data(foton['maps'])
+    if not config.PREVENT_MAP_CONSOLIDATION:
+        tc.create_combined_tilemaps(map_data)
+
+    # every map is independent from here on, so spread them across all cores
+    config_snapshot = config.snapshot()
+    with cli.create_process_pool() as executor:
+        all_maps = list(executor.map(
+            mg.process_map, [(mapdict, config_snapshot) for mapdict in map_data["maps"].values()]
+        ))
+
+    mg.warn_about_stale_headers(map_data)
+
+    # the instantiation files cover every map and sprite of foton.json, so a single overridden
+    # map must not replace them
+    if config.TMX_OVERRIDE and config.MAP_NAME:
+        print("Map file overridden, skipping generation of instantiation files")
+    else:
         write_instantiation_files(all_maps,foton['sprites'])
 
     if config.CREATE_GLOBALS_FILE:
@@ -3,52 +3,40 @@
 """mapdata_models.py: Defines map models to be used in the generation of butano-compatible
                       source files."""
 
-import math
+from functools import lru_cache
 import xml.etree.ElementTree as ET
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import numpy as np
 from PIL import Image
 
 import config
+from tilemap_minimizer import parse_csv_tmx_map
 
-def parse_csv_tmx_map(tmx_map):
-    '''Parses tiled map file data (in CSV format).'''
-    clean_map = []
-    for val in tmx_map.split(","):
-        if val in ('\n',''):
-            continue
-        clean_map.append(int(val))
-    return clean_map
+def get_properties(obj):
+    '''Returns the custom properties of a tiled object as a dict of names and values.'''
+    properties = obj.find("properties")
+    if properties is None:
+        return {}
+    return {prop.get("name"): prop.get("value") for prop in properties.findall("property")}
 
 def calculate_boundary_data(boundary):
     '''This function is meant to be invoked for each boundary or similar polygon object in the
-       tiled TMX file. For such an object it creates a list of points that make up that polygon,
-       also takes note of the minimum and maximum values for x and y, and some more metadata.'''
-    number_of_points = len(boundary.find("polygon").get("points").split(" "))
-    origin = (boundary.get("x"),boundary.get("y"))
-
-    min_x,max_x,min_y,max_y = math.inf,0,math.inf,0
-    points = []
-
-    for point in boundary.find("polygon").get("points").split(" "):
-        x = int(float(point.split(",")[0]) + float(origin[0]))
-        x = 0 if x < 0 else x
-        y = int(float(point.split(",")[1]) + float(origin[1]))
-        y = 0 if y < 0 else y
-
-        min_x = x if x < min_x else min_x
-        max_x = x if x > max_x else max_x
-        min_y = y if y < min_y else min_y
-        max_y = y if y > max_y else max_y
-
-        points.append({'x':str(x),'y':str(y)})
-
-    map_name,spawn_point_name = None,None
-    if boundary.find("properties"):
-        for prop in boundary.find("properties").findall("property"):
-            if prop.get("name") == "destination":
-                map_name = prop.get("value")
-            if prop.get("name") == "spawnpoint":
-                spawn_point_name = prop.get("value")
+       tiled TMX file. For such an object it creates an array of the (x,y) points that make up that
+       polygon, also takes note of the minimum and maximum values for x and y, and some more
+       metadata.'''
+    polygon_points = boundary.find("polygon").get("points")
+    origin = (float(boundary.get("x")),float(boundary.get("y")))
+
+    # all points as (x,y) rows, positioned on the map and clamped to it
+    points = np.fromstring(polygon_points.replace(" ",","), dtype=np.float64, sep=",")
+    points = np.maximum((points.reshape(-1,2)+origin).astype(np.int64), 0)
+    number_of_points = len(points)
+    min_x,min_y = points.min(axis=0).tolist()
+    max_x,max_y = points.max(axis=0).tolist()
+
+    properties = get_properties(boundary)
+    map_name = properties.get("destination")
+    spawn_point_name = properties.get("spawnpoint")
 
     return {
                 'number_of_points':number_of_points,
@@ -61,6 +49,74 @@ def calculate_boundary_data(boundary):
                 'spawn_point_name':spawn_point_name
             }
 
+def get_flipped_screenblock_order(width, height, tilesize_factor):
+    '''Returns the order of the tiles of a map whose right half is stored in its own
+       screenblocks, i.e. the left half of every row of each screenblock comes first.'''
+    screenblock_2nd_half = False
+    row_length = width//tilesize_factor
+    order = []
+    i,k = 0,0
+
+    while i < width*height:
+        order.append(i)
+
+        if k == row_length-1:
+            i += row_length
+            k = -1
+        if not screenblock_2nd_half and i == width*32-1:
+            i = row_length-1
+            screenblock_2nd_half = True
+        if screenblock_2nd_half and i == width*32+row_length-1:
+            i = width*32-1
+            screenblock_2nd_half = False
+        if not screenblock_2nd_half and i == width*64-1:
+            i = width*32+row_length-1
+            screenblock_2nd_half = True
+
+        i += 1
+        k += 1
+
+    return order
+
+@lru_cache
+def get_screenblock_order(width, height, tilesize_factor):
+    '''Returns the order in which the tiles of a map are stored in its tilemap data and the
+       separator to write after each tile. Since the GBA/butano puts part of the map into
+       different screenblocks depending on the maps dimensions, this is not always the order of
+       the tiles in the map.'''
+    screenblock_flip = bool(width == 64 and height in (32,64))
+    if screenblock_flip:
+        order = get_flipped_screenblock_order(width, height, tilesize_factor)
+    else:
+        order = range(width*height)
+
+    separators = []
+    for i in order:
+        separator = ","
+        if (i+1) % width == 0 and i > 0:
+            separator += "\n"
+        if (i+1) % 16 == 0 and i > 0:
+            separator += "\n" + "        "
+        separators.append(separator)
+
+    order = np.array(order)
+    order.flags.writeable = False
+    return order, tuple(separators)
+
+@lru_cache
+def get_tile_positions(width, height, tilesize_factor):
+    '''Returns for every tile of the tilemap data of a map, in the order of get_screenblock_order,
+       the index of the tiled tile it is part of and its x and y offset within that tile. Cached
+       like the order itself, so the returned arrays are read only.'''
+    cell, _ = get_screenblock_order(width, height, tilesize_factor)
+    base_id = (cell % width)//tilesize_factor+\
+              cell//(width*tilesize_factor)*(width//tilesize_factor)
+    x_offset = cell % tilesize_factor
+    y_offset = cell//width % tilesize_factor
+    for positions in (base_id, x_offset, y_offset):
+        positions.flags.writeable = False
+    return base_id, x_offset, y_offset
+
 @dataclass
 class TilemapImageObject:
     '''Python representation of a tilemap image.'''
@@ -72,6 +128,37 @@ class TilemapImageObject:
     min_height: int
     min_rgb: Image = None
 
+@dataclass
+class TileArraysObject:
+    '''Python representation of the tiles of a compressed tileset as one array per property,
+       indexed by tile.'''
+    h_flipped: np.ndarray
+    v_flipped: np.ndarray
+    unique: np.ndarray
+    relative_x: np.ndarray   # position of the unique tile a non unique tile refers to
+    relative_y: np.ndarray
+    non_unique_tile_count: np.ndarray   # number of non unique tiles up to and including a tile
+
+def create_tile_arrays(tilemap_tiles):
+    '''Converts the list of tiles created by tilemap_compressor into a TileArraysObject.'''
+    return TileArraysObject(
+        np.array([tile["h_flipped"] for tile in tilemap_tiles], dtype=bool),
+        np.array([tile["v_flipped"] for tile in tilemap_tiles], dtype=bool),
+        np.array([tile["unique"] for tile in tilemap_tiles], dtype=bool),
+        np.array([tile["relative"][0] for tile in tilemap_tiles], dtype=np.int32),
+        np.array([tile["relative"][1] for tile in tilemap_tiles], dtype=np.int32),
+        np.array([tile["non_unique_tile_count"] for tile in tilemap_tiles], dtype=np.int32)
+    )
+
+@dataclass(slots=True)
+class MapSizeObject:
+    '''Python representation of all maps sharing the same size.'''
+    x: str
+    y: str
+    count: int = 0
+    names: list = field(default_factory=list)
+    keys: list = field(default_factory=list)    # map names shortened to 8 characters
+
 @dataclass
 class MapObject:
     '''Python representation of a map.'''
@@ -79,7 +166,7 @@ class MapObject:
     name: str = ""
     width: int = 0
     height: int = 0
-    bitmap: Image = None   # image data of tilemap
+    bitmap: TileArraysObject = None   # tiles of the compressed tileset
     bitmap_width: int = 0    # width of tileset bitmap in tiles
     bitmap_filename: str = ""
     columns: int = 0
@@ -130,114 +217,121 @@ class MapObject:
            then get the tile_id of the tile from the tilemap metadata,
            finally calculate the real_id of the tile in the tilemap image that base_id corresponds to.
            After that, modify the real_id with flipping information.'''
+        # position of every tile of the GBA tilemap within the map and within its tiled tile, in
+        # the order they are stored in
+        _, separators = get_screenblock_order(self.width, self.height, self.tilesize_factor)
+        base_id, x_offset, y_offset = get_tile_positions(self.width, self.height,
+                                                         self.tilesize_factor)
+
+        # number of 8x8 tiles in a row of the tileset bitmap and the position of every tile of the
+        # GBA tilemap within its tiled tile in there
+        bitmap_row_length = self.bitmap_width*self.tilesize_factor
+        tile_offset = y_offset*bitmap_row_length + x_offset
+
+        if not config.PREVENT_TILEMAP_MINIMIZATION:
+            tile_id_lookups = self.get_tile_id_lookups()
+
         for layer in self.map_layers:
             layer_name = layer.get("name")
-            tilemap = parse_csv_tmx_map(layer.find("data").text)
+            tilemap = parse_csv_tmx_map(layer, self.tmx_filepath)
             self.tilelist += "        // "+layer_name+" layer\n"
 
-            tilelist = "        "
-
-            # since the GBA/butano puts part of the map into different screenblocks depending
-            # on the maps dimensions, we use this conditional to alter the map arithmetic
-            screenblock_flip = bool(self.width == 64 and self.height in (32,64))
-            screenblock_2nd_half = False
-            i,k = 0,0
-
-            while i < self.width*self.height:
-                base_id = int((i-int(i/self.width)*self.width)/self.tilesize_factor)+\
-                          int(i/(self.width*self.tilesize_factor))*int(self.width/self.tilesize_factor)
-                x_offset = i % self.tilesize_factor
-                y_offset = int(i/self.width) % self.tilesize_factor
-
-                tile_id = tilemap[base_id]
-                if not config.PREVENT_TILEMAP_MINIMIZATION:
-                    for tile in self.tiles:
-                        if self.name in self.tiles[tile]["first_gid"] and \
-                          self.tiles[tile]["first_gid"][self.name] <= \
-                          tile_id < self.tiles[tile]["last_gid"][self.name]:
-                            tile_id_temp = self.tiles[tile]["used_tiles"].index(
-                                tile_id - self.tiles[tile]["first_gid"][self.name]
-                            )
-                            tile_id = tile_id_temp + self.tiles[tile]['start_tile']
-                else:
-                    tile_id = tilemap[base_id]-1 if tilemap[base_id] != 0 else 0
-
-                # offset all tiles to account for the transparent tile at the beginning
-                tile_id += 1 if tile_id != 0 else 0
-
-                real_id = tile_id%self.bitmap_width*self.tilesize_factor+\
-                          int(tile_id/self.bitmap_width)*self.bitmap_width*\
-                          self.tilesize_factor*self.tilesize_factor+\
-                          y_offset*self.bitmap_width*self.tilesize_factor + x_offset
-
-                flip_offset = 0
-                if self.bitmap[real_id]["h_flipped"]:
-                    flip_offset += config.H_FLIP
-                if self.bitmap[real_id]["v_flipped"]:
-                    flip_offset += config.V_FLIP
-                if not self.bitmap[real_id]["unique"]:
-                    real_id = self.bitmap[real_id]["relative"][1]*self.bitmap_width*self.tilesize_factor+\
-                              self.bitmap[real_id]["relative"][0]
-                real_id -= self.bitmap[real_id]["non_unique_tile_count"]
-                real_id += flip_offset
-                tilelist += str(real_id) + ","
-
-                if (i+1) % self.width == 0 and i > 0:
-                    tilelist += "\n"
-                if (i+1) % 16 == 0 and i > 0:
-                    tilelist += "\n" + "        "
-
-                if screenblock_flip and k == int(self.width/self.tilesize_factor)-1:
-                    i += int(self.width/self.tilesize_factor)
-                    k = -1
-                if screenblock_flip and not screenblock_2nd_half and i == self.width*32-1:
-                    i = int(self.width/self.tilesize_factor)-1
-                    screenblock_2nd_half = True
-                if screenblock_flip and screenblock_2nd_half\
-                and i == self.width*32+int(self.width/self.tilesize_factor)-1:
-                    i = self.width*32-1
-                    screenblock_2nd_half = False
-                if screenblock_flip and not screenblock_2nd_half and i == self.width*64-1:
-                    i = self.width*32+int(self.width/self.tilesize_factor)-1
-                    screenblock_2nd_half = True
-
-                i += 1
-                k += 1
-
-            self.tilelist += tilelist[:-8]
+            tile_id = tilemap[base_id]
+            if not config.PREVENT_TILEMAP_MINIMIZATION:
+                # only few distinct tiles are used per layer, so remap each of them just once
+                used_ids, inverse = np.unique(tile_id, return_inverse=True)
+                tile_id = np.array(
+                    self.remap_tile_ids(used_ids.tolist(), tile_id_lookups), dtype=np.int64
+                )[inverse]
+            else:
+                tile_id = np.where(tile_id != 0, tile_id-1, 0)
+
+            # offset all tiles to account for the transparent tile at the beginning
+            tile_id += tile_id != 0
+
+            real_id = tile_id%self.bitmap_width*self.tilesize_factor+\
+                      tile_id//self.bitmap_width*bitmap_row_length*self.tilesize_factor+\
+                      tile_offset
+
+            flip_offset = np.where(self.bitmap.h_flipped[real_id], config.H_FLIP, 0)+\
+                          np.where(self.bitmap.v_flipped[real_id], config.V_FLIP, 0)
+            real_id = np.where(
+                self.bitmap.unique[real_id], real_id,
+                self.bitmap.relative_y[real_id]*bitmap_row_length+\
+                self.bitmap.relative_x[real_id]
+            )
+            real_id -= self.bitmap.non_unique_tile_count[real_id]
+            real_id += flip_offset
+
+            tilelist = "".join(map(str.__add__, map(str, real_id.tolist()), separators))
+            self.tilelist += ("        " + tilelist)[:-8]
+
+    def get_tile_id_lookups(self):
+        '''Returns for every tileset used by the map a dict which maps the tile ids of its used
+           tiles in the tiled map to their position in the minimized tilemap. The dicts are meant
+           to be applied in order, like the tilesets are searched.'''
+        tile_id_lookups = []
+        for tile in self.tiles.values():
+            if self.name in tile["first_gid"]:
+                first_gid = tile["first_gid"][self.name]
+                tile_id_lookups.append({
+                    first_gid + used_tile: position + tile['start_tile']
+                    for position, used_tile in enumerate(tile["used_tiles"])
+                    if used_tile < tile["last_gid"][self.name] - first_gid
+                })
+        return tile_id_lookups
+
+    def remap_tile_ids(self, tile_ids, tile_id_lookups):
+        '''Maps tile ids of the tiled map to their position in the minimized tilemap using the
+           lookups of get_tile_id_lookups. Raises a ValueError for a tile which is not among the
+           used tiles of any tileset, as it would end up at a wrong position otherwise.'''
+        remapped_ids = []
+        for tile_id in tile_ids:
+            remapped = tile_id == 0
+            for lookup in tile_id_lookups:
+                if tile_id in lookup:
+                    tile_id, remapped = lookup[tile_id], True
+            if not remapped:
+                raise ValueError("Tile id "+str(tile_id)+" of map "+self.name+\
+                                 " is not part of its minimized tilemap")
+            remapped_ids.append(tile_id)
+        return remapped_ids
 
     def gather_map_data(self):
         '''Gathers all extra data, like spawn points and boundaries, from tiled TMX maps.'''
         self.boundaries, self.spawn_points, self.gateways, self.objects, self.npcs, self.walk_cycles = [],[],[],[],[],[]
         for object_group in self.xml.findall("objectgroup"):
-            if config.PARSE_ACTORS and object_group.get("name") == "actors":
+            group_name = object_group.get("name")
+            if config.PARSE_ACTORS and group_name == "actors":
                 for obj in object_group.findall("object"):
-                    if obj.get("type") == "spawn_point"\
-                    or obj.get("class") == "spawn_point":
+                    # older tiled versions store the object class as type
+                    obj_types = (obj.get("type"),obj.get("class"))
+                    if "spawn_point" in obj_types:
                         self.spawn_points.append(obj)
 
-                    if obj.get("type") == "gateway"\
-                    or obj.get("class") == "gateway":
-                        self.gateways.append(calculate_boundary_data(obj))
+                    if "gateway" in obj_types:
+                        gateway = calculate_boundary_data(obj)
+                        if gateway['map_name'] is None or gateway['spawn_point_name'] is None:
+                            raise ValueError("In gateway construction: No destination or "+\
+                                             "spawnpoint found for gateway "+\
+                                             str(obj.get("name", obj.get("id")))+\
+                                             " in map "+self.name)
+                        self.gateways.append(gateway)
 
-                    if obj.get("type") == "chest"\
-                    or obj.get("class") == "chest":
+                    if "chest" in obj_types:
                         self.objects.append(obj)
 
-                    if obj.get("type") == "character"\
-                    or obj.get("class") == "character":
+                    if "character" in obj_types:
                         self.npcs.append(obj)
 
-            if config.PARSE_ACTORS and object_group.get("name") == "animations":
+            elif config.PARSE_ACTORS and group_name == "animations":
                 for obj in object_group.findall("object"):
-                    if obj.get("type") == "walk_cycle"\
-                    or obj.get("class") == "walk_cycle":
+                    if "walk_cycle" in (obj.get("type"),obj.get("class")):
                         self.walk_cycles.append(obj)
 
-            if config.PARSE_BOUNDARIES and object_group.get("name") == "boundaries":
+            elif config.PARSE_BOUNDARIES and group_name == "boundaries":
                 for obj in object_group.findall("object"):
-                    if obj.get("type") == "boundary"\
-                    or obj.get("class") == "boundary":
+                    if "boundary" in (obj.get("type"),obj.get("class")):
                         self.boundaries.append(calculate_boundary_data(obj))
 
     def name_lower(self):
@@ -6,22 +6,18 @@
 import os
 import sys
 import json
-import argparse
-from numpy import subtract
 from PIL import Image, ImageOps
 
+import cli
 import config
 import tilemap_minimizer as tm
-from mapdata_models import TilemapImageObject
+from mapdata_models import TilemapImageObject, create_tile_arrays
 
 def tile_compare(left, right):
     '''Does a pixel by pixel comparison of 8x8 tile. Returns True if all pixels are the same
-       color, return False otherwise.'''
-    for x in range(8):
-        for y in range(8):
-            if (subtract(left.getpixel((x,y)),right.getpixel((x,y))) != [0,0,0]).any():
-                return False
-    return True
+       color, return False otherwise. Both tiles share the same mode, so their raw pixel data
+       can be compared directly.'''
+    return left.tobytes() == right.tobytes()
 
 def compare_tiles(tilemap_src):
     '''Creates a tiles for a tilemap which (a) defines unique tiles, (b) references to a unique
@@ -294,19 +290,20 @@ def create_tilemap(mapdict, combined_map=False):
        map file.'''
     print("creating compressed tileset: " + mapdict['map_name'])
     tiles, tilemap_width = "", ""
-    latest_image_change_date = -1
-    for img in mapdict['images']:
-        if os.path.getctime(
-          "graphics/ressources/" + mapdict["images"][img]['image_src']
-        ) > latest_image_change_date:
-            latest_image_change_date = os.path.getctime(
-                "graphics/ressources/" + mapdict["images"][img]['image_src']
-            )
+    latest_image_change_date = max(
+        (os.stat("graphics/ressources/" + img['image_src']).st_ctime
+         for img in mapdict['images'].values()),
+        default=-1
+    )
+    try:
+        image_change_date = os.stat("graphics/" + mapdict['map_name'] + ".bmp").st_ctime
+    except FileNotFoundError:
+        image_change_date = None
 
     generate_image = True
     if not config.FORCE_IMAGE_GENERATION and \
-       os.path.exists("graphics/ressources/" + mapdict['map_name'] + ".json") and \
-       os.path.getctime("graphics/" + mapdict['map_name'] + ".bmp") >= latest_image_change_date:
+       image_change_date is not None and image_change_date >= latest_image_change_date and \
+       os.path.exists("graphics/ressources/" + mapdict['map_name'] + ".json"):
         tiles,tilemap_width,generate_image = get_tiles(mapdict['map_name'])
 
     # Only generate the compressed tileset if
@@ -328,79 +325,62 @@ def create_tilemap(mapdict, combined_map=False):
         print("Source image not modified, skipping generation of new compressed tileset")
 
 
-    return tiles,tilemap_width,True
+    return create_tile_arrays(tiles),tilemap_width,True
+
+def _create_tilemap(payload):
+    '''Creates the compressed tileset of a single or combined map. Meant to be run in a worker
+       process.'''
+    mapdict, combined_map, config_snapshot = payload
+    config.restore(config_snapshot)
+    return create_tilemap(mapdict, combined_map)
+
+def create_combined_tilemaps(map_data):
+    '''Creates the compressed tilesets of all combined maps and references them in each of the
+       maps they include. Several combined maps are created in parallel.'''
+    combined_maps = map_data["combined_maps"]
+    if len(combined_maps) > 1:
+        config_snapshot = config.snapshot()
+        with cli.create_process_pool(min(os.cpu_count(), len(combined_maps))) as executor:
+            tilemaps = dict(zip(combined_maps, executor.map(
+                _create_tilemap,
+                [(cmap_data, True, config_snapshot) for cmap_data in combined_maps.values()]
+            )))
+    else:
+        tilemaps = {
+            map_name: create_tilemap(cmap_data, True)
+            for map_name,cmap_data in combined_maps.items()
+        }
+    for map_name,(bitmap,tilemap_width,success) in tilemaps.items():
+        if success:
+            for combined_map in combined_maps[map_name]["maps"]:
+                map_data["maps"][combined_map]["combined_tilemap"] = {
+                    "mapdict":combined_maps[map_name],
+                    "bitmap":bitmap,
+                    "tilemap_width":tilemap_width
+                }
 
 if __name__ == "__main__":
-    argparser = argparse.ArgumentParser(
-        description="""
-            Generate compressed tilemap bitmaps from referenced tilemaps in tiled projects.
-            """)
-    argparser.add_argument('-f','--force',dest='force',action='store_true',
-                           help='Force all files generation')
-    argparser.add_argument('--force-image-gen',dest='force_img',action='store_true',
-                           help='Force tilemap image generation')
-    argparser.add_argument('-s','--save-temp-files',dest='save_temp_imgs',action='store_true',
-                           help='Save temporary files (like *_minimized.bmp and *_combined.bmp '+\
-                                'and some json files)')
-    argparser.add_argument('--map-file',dest='tmx_override',
-                           help='Specifiy tiled TMX map, ignoring foton.json; requires --map-name')
-    argparser.add_argument('--map-name',dest='map_name',
-                           help='Specifiy map name, ignoring foton.json; requires --map-file')
-    argparser.add_argument('--no-minimization',dest='prevent_minimization',action='store_true',
-                           help='Do not minimize tilemap before compression')
-    argparser.add_argument('--no-map-consolidation',dest='prevent_consolidation',
-                           action='store_true',
-                           help='Prevent consolidation of maps so each map will have their '+\
-                                'own generated tilemap')
-    args = argparser.parse_args()
-
-    if args.force:
-        config.FORCE_IMAGE_GENERATION = True
-    if args.force_img:
-        config.FORCE_IMAGE_GENERATION = True
-    if args.save_temp_imgs:
-        config.SAVE_TEMPORARY_FILES = True
-    if ( args.tmx_override and not args.map_name ) or \
-       ( not args.tmx_override and args.map_name ):
-        print("If either --map-file or --map-name is set, the other must be set, too")
-        sys.exit()
-    if args.tmx_override:
-        config.TMX_OVERRIDE = args.tmx_override.split('/')[-1]
-        if not os.path.exists("graphics/ressources/" + config.TMX_OVERRIDE):
-            print("Did not find a tiled map file: "+config.TMX_OVERRIDE)
-            sys.exit()
-    if args.map_name:
-        config.MAP_NAME = args.map_name
-    if args.prevent_minimization:
-        config.PREVENT_TILEMAP_MINIMIZATION = True
-    if args.prevent_consolidation:
-        config.PREVENT_MAP_CONSOLIDATION = True
-
-    with open("graphics/ressources/foton.json",encoding='UTF-8') as foton_json:
-        if config.TMX_OVERRIDE and config.MAP_NAME:
-            foton = json.loads('[{"name":"'+config.MAP_NAME+'","tmx":"'+config.TMX_OVERRIDE+'"}]')
+    cli.parse_args(
+        "Generate compressed tilemap bitmaps from referenced tilemaps in tiled projects.",
+        ("force_img",) + cli.COMMON_ARGUMENTS,
+        ("FORCE_IMAGE_GENERATION",)
+    )
+
+    map_data = tm.get_map_data(cli.load_foton()['maps'])
+    if not config.PREVENT_MAP_CONSOLIDATION:
+        create_combined_tilemaps(map_data)
+
+    # the tilesets of all maps not included in a combined tilemap are independent
+    config_snapshot = config.snapshot()
+    tilemap_payloads = []
+    for map_name in map_data["maps"]:
+        if config.PREVENT_MAP_CONSOLIDATION or \
+           not map_data["maps"][map_name]["combined_tilemap"]:
+            tilemap_payloads.append((map_data["maps"][map_name], False, config_snapshot))
         else:
-            foton = json.load(foton_json)
-
-        map_data = tm.get_map_data(foton['maps'])
-        if not config.PREVENT_MAP_CONSOLIDATION:
-            for map_name in map_data["combined_maps"]:
-                tiles,tilemap_width,success = create_tilemap(
-                    map_data["combined_maps"][map_name], True
-                )
-                if success:
-                    for combined_map in map_data["combined_maps"][map_name]["maps"]:
-                        map_data["maps"][combined_map]["combined_tilemap"] = {
-                            "mapdict":map_data["combined_maps"][map_name],
-                            "bitmap":tiles
-                        }
-
-        for map_name in map_data["maps"]:
-            if config.PREVENT_MAP_CONSOLIDATION or \
-               not map_data["maps"][map_name]["combined_tilemap"]:
-                create_tilemap(map_data["maps"][map_name])
-            else:
-                print("Skipping generation of tileset \""+map_name+"\" since it is included in: "\
-                      +map_data["maps"][map_name]["combined_tilemap"]["mapdict"]["map_name"])
+            print("Skipping generation of tileset \""+map_name+"\" since it is included in: "\
+                  +map_data["maps"][map_name]["combined_tilemap"]["mapdict"]["map_name"])
+    with cli.create_process_pool() as executor:
+        list(executor.map(_create_tilemap, tilemap_payloads))
 
     print("Finished")
@@ -3,15 +3,14 @@
 """tilemap_minimizer.py: Generate minimized and consolidated tilemaps from maps
                          referenced in tiled projects. """
 
-import os
 import sys
 import json
 import hashlib
-import argparse
 import numpy as np
 import xml.etree.ElementTree as ET
 from PIL import Image
 
+import cli
 import config
 
 # From Stackoverflow: https://stackoverflow.com/a/1181922
@@ -54,20 +53,27 @@ def is_uniform_colour(tile):
                 return False
     return base_colour
 
-def find_used_tiles(tilemap_xml, first_gid, last_gid):
+def parse_csv_tmx_map(layer, tmx_filepath):
+    '''Parses the data of a tiled map layer (in CSV format) into an array of tile ids. Raises an
+       error if it does not hold a tile id for every tile of the layer, as older numpy versions
+       silently stop parsing at the first malformed value.'''
+    try:
+        tiles = np.fromstring(layer.find("data").text.strip().rstrip(","), dtype=np.int64, sep=",")
+    except ValueError:
+        tiles = None
+    if tiles is None or len(tiles) != int(layer.get("width"))*int(layer.get("height")):
+        raise ValueError("Malformed or incomplete CSV data in layer "+str(layer.get("name"))+\
+                         " of tiled map file: "+tmx_filepath)
+    return tiles
+
+def find_used_tiles(tilemap_xml, tmx_filepath, first_gid, last_gid):
     '''Iterates over all tiles used in the tiled TMX file and creates a list of used tiles.'''
-    img_used_tiles = []
+    img_used_tiles = {0}
     for layer in tilemap_xml.iter("layer"):
-        data = layer.find("data").text
-        for value in data.split(","):
-            if value not in ("\n",""):
-                if int(value) >= first_gid and int(value) < last_gid:
-                    tid = int(value)-first_gid if int(value) != 0 else 0
-                    img_used_tiles.append(tid)
-    img_used_tiles.append(0)
-    img_used_tiles = list(set(img_used_tiles))
-    img_used_tiles.sort()
-    return img_used_tiles
+        tiles = parse_csv_tmx_map(layer, tmx_filepath)
+        tiles = np.unique(tiles[(tiles >= first_gid) & (tiles < last_gid)])
+        img_used_tiles.update(np.where(tiles != 0, tiles-first_gid, 0).tolist())
+    return sorted(img_used_tiles)
 
 def create_tileset(mapdict):
     '''Calculates the total tile count and sets appropriate image dimensions for the tileset
@@ -332,7 +338,8 @@ def open_map(tilemap_json, map_data):
             'first_gid': {map_name: tsx["first_gid"]},
             'last_gid': {map_name: tsx["last_gid"]},
             'start_tile': start_tile,
-            'used_tiles': find_used_tiles(tilemap_xml, tsx["first_gid"], tsx["last_gid"])
+            'used_tiles': find_used_tiles(tilemap_xml, tilemap_tmx_path,
+                                          tsx["first_gid"], tsx["last_gid"])
         }
         start_tile += len(imgdict['used_tiles']) + len(mapdict['images'])
         mapdict['images'][image_file_name] = imgdict
@@ -453,56 +460,12 @@ def get_map_data(maps):
     return map_data
 
 if __name__ == "__main__":
-    argparser = argparse.ArgumentParser(
-        description="""
-            Generate minimized tilemaps from referenced tilemaps in tiled projects.
-            """)
-    argparser.add_argument('-f','--force',dest='force',action='store_true',
-                           help='Force all files generation')
-    argparser.add_argument('--force-image-gen',dest='force_img',action='store_true',
-                           help='Force tilemap image generation')
-    argparser.add_argument('-s','--save-temp-files',dest='save_temp_imgs',action='store_true',
-                           help='Save temporary files (like *_minimized.bmp and *_combined.bmp '+\
-                                'and some json files)')
-    argparser.add_argument('--map-file',dest='tmx_override',
-                           help='Specifiy tiled TMX map, ignoring foton.json; requires --map-name')
-    argparser.add_argument('--map-name',dest='map_name',
-                           help='Specifiy map name, ignoring foton.json; requires --map-file')
-    argparser.add_argument('--no-minimization',dest='prevent_minimization',action='store_true',
-                           help='Do not minimize tilemap before compression')
-    argparser.add_argument('--no-map-consolidation',dest='prevent_consolidation',
-                           action='store_true',
-                           help='Prevent consolidation of maps so each map will have their '+\
-                                'own generated tilemap')
-    args = argparser.parse_args()
-
-    if args.force:
-        config.FORCE_IMAGE_GENERATION = True
-    if args.force_img:
-        config.FORCE_IMAGE_GENERATION = True
-    if args.save_temp_imgs:
-        config.SAVE_TEMPORARY_FILES = True
-    if ( args.tmx_override and not args.map_name ) or \
-       ( not args.tmx_override and args.map_name ):
-        print("If either --map-file or --map-name is set, the other must be set, too")
-        sys.exit()
-    if args.tmx_override:
-        config.TMX_OVERRIDE = args.tmx_override.split('/')[-1]
-        if not os.path.exists("graphics/ressources/" + config.TMX_OVERRIDE):
-            print("Did not find a tiled map file: "+config.TMX_OVERRIDE)
-            sys.exit()
-    if args.map_name:
-        config.MAP_NAME = args.map_name
-    if args.prevent_minimization:
-        config.PREVENT_TILEMAP_MINIMIZATION = True
-    if args.prevent_consolidation:
-        config.PREVENT_MAP_CONSOLIDATION = True
-
-    with open("graphics/ressources/foton.json",encoding='UTF-8') as foton_json:
-        if config.TMX_OVERRIDE and config.MAP_NAME:
-            foton = json.loads('[{"name":"'+config.MAP_NAME+'","tmx":"'+config.TMX_OVERRIDE+'"}]')
-        else:
-            foton = json.load(foton_json)
-        get_map_data(foton['maps'])
+    cli.parse_args(
+        "Generate minimized tilemaps from referenced tilemaps in tiled projects.",
+        ("force_img",) + cli.COMMON_ARGUMENTS,
+        ("FORCE_IMAGE_GENERATION",)
+    )
+
+    get_map_data(cli.load_foton()['maps'])
 
     print("Finished")